@@ -8,7 +8,8 @@ python -m venv .venv
 # python -m pip install --upgrade pip
 
 # Install required dependencies
-# pip install gspread google-auth google-auth-oauthlib sib-api-v3-sdk
+# pip install gspread google-auth google-auth-oauthlib sib-api-v3-sdk requests orjson
+# Optional, for --fuzzy: pip install rapidfuzz numpy
 
 # Run the script
-python scripts\$($args[0]).py
+python scripts\$($args[0]).py @($args | Select-Object -Skip 1)
@@ -0,0 +1,182 @@
+"""
+Brevo contact download and command line options shared by the export scripts.
+
+get_all_brevo_contacts downloads every contact through an export job, falling back to the
+paginated contacts API, and search_brevo_contact_by_email_api looks up one email for --no-cache.
+"""
+
+import argparse
+import csv
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from sib_api_v3_sdk import (
+    ApiClient,
+    Configuration,
+    ContactsApi,
+    ProcessApi,
+    RequestContactExport,
+    RequestContactExportCustomContactFilter,
+)
+from sib_api_v3_sdk.rest import ApiException
+
+from brevo_match import FUZZY_SCORE_CUTOFF
+
+log = logging.getLogger(__name__)
+
+BREVO_PAGE_LIMIT = 500
+BREVO_MAX_WORKERS = 8
+
+# Simple regex for email validation
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def is_valid_email(email):
+    return EMAIL_RE.match(email) is not None
+
+
+def get_brevo_api(api_key):
+    log.debug("Initializing Brevo API client")
+    configuration = Configuration()
+    configuration.api_key["api-key"] = api_key
+    return ContactsApi(ApiClient(configuration))
+
+
+def fetch_brevo_contacts_page(api, offset, limit, retries=5, **filters):
+    """Fetch one page of Brevo contacts, backing off exponentially when rate limited."""
+    for attempt in range(retries):
+        try:
+            return api.get_contacts(limit=limit, offset=offset, **filters)
+        except ApiException as e:
+            if e.status != 429 or attempt == retries - 1:
+                raise
+            delay = 2 ** attempt
+            log.debug("Rate limited fetching offset=%s, retrying in %ss", offset, delay)
+            time.sleep(delay)
+
+
+def get_all_brevo_contacts_paginated(api, **filters):
+    """Download all Brevo contacts matching the optional get_contacts filters page by page and return as a list."""
+    limit = BREVO_PAGE_LIMIT
+    log.debug("Downloading Brevo contacts page by page (filters=%s)...", filters)
+    first_page = fetch_brevo_contacts_page(api, 0, limit, **filters)
+    all_contacts = list(first_page.contacts or [])
+    # The first page gives the total count, the remaining pages are fetched concurrently
+    offsets = range(limit, first_page.count or 0, limit)
+    log.debug("Brevo reports %s contacts, fetching %s more batches", first_page.count, len(offsets))
+    with ThreadPoolExecutor(max_workers=BREVO_MAX_WORKERS) as executor:
+        pages = executor.map(lambda offset: fetch_brevo_contacts_page(api, offset, limit, **filters), offsets)
+        for page in pages:
+            all_contacts.extend(page.contacts or [])
+    log.debug("Downloaded %s contacts from Brevo.", len(all_contacts))
+    return all_contacts
+
+
+def parse_brevo_export(lines):
+    """
+    Parse the CSV lines of a Brevo contact export into the same dict shape as the contacts API.
+    Returns None when the export has no contact ID column.
+    """
+    lines = iter(lines)
+    header_line = next(lines, "")
+    delimiter = ";" if header_line.count(";") > header_line.count(",") else ","
+    header = [column.strip().upper() for column in next(csv.reader([header_line], delimiter=delimiter), [])]
+    id_column = next((c for c in ("CONTACT_ID", "CONTACT ID", "ID") if c in header), None)
+    if id_column is None:
+        log.warning("Brevo export has no contact ID column: %s", header)
+        return None
+    contacts = []
+    for values in csv.DictReader(lines, fieldnames=header, delimiter=delimiter):
+        contact_id = (values.get(id_column) or "").strip()
+        contacts.append({
+            "id": int(contact_id) if contact_id.isdigit() else contact_id,
+            "email": (values.get("EMAIL") or "").strip(),
+            "attributes": {
+                "FIRSTNAME": (values.get("FIRSTNAME") or "").strip(),
+                "LASTNAME": (values.get("LASTNAME") or "").strip(),
+            },
+        })
+    return contacts
+
+
+def export_all_brevo_contacts(api, timeout=300, poll_interval=2):
+    """
+    Download all Brevo contacts through a single export job instead of paginating.
+    Returns None when the export is not available, so the caller can fall back to pagination.
+    """
+    log.debug("Requesting Brevo contact export...")
+    export_request = RequestContactExport(
+        export_attributes=["EMAIL", "FIRSTNAME", "LASTNAME"],
+        custom_contact_filter=RequestContactExportCustomContactFilter(action_for_contacts="allContacts"),
+    )
+    try:
+        process_id = api.request_contact_export(export_request).process_id
+        process_api = ProcessApi(api.api_client)
+        deadline = time.monotonic() + timeout
+        process = process_api.get_process(process_id)
+        while process.status != "completed" or not process.export_url:
+            if time.monotonic() > deadline:
+                log.warning("Brevo export %s did not complete within %ss", process_id, timeout)
+                return None
+            time.sleep(poll_interval)
+            process = process_api.get_process(process_id)
+    except ApiException as e:
+        log.warning("Brevo contact export unavailable: %s %s", e.status, e.reason)
+        return None
+
+    log.debug("Downloading Brevo export for process %s", process_id)
+    with requests.get(process.export_url, stream=True, timeout=60) as resp:
+        if resp.status_code != 200:
+            log.warning("Failed to download Brevo export: %s", resp.status_code)
+            return None
+        resp.encoding = "utf-8-sig"
+        contacts = parse_brevo_export(resp.iter_lines(decode_unicode=True))
+    if contacts is not None:
+        log.debug("Downloaded %s contacts from Brevo export.", len(contacts))
+    return contacts
+
+
+def get_all_brevo_contacts(api):
+    """Download all Brevo contacts and return as a list."""
+    contacts = export_all_brevo_contacts(api)
+    if contacts is None:
+        contacts = get_all_brevo_contacts_paginated(api)
+    return contacts
+
+
+def search_brevo_contact_by_email_api(api, email):
+    """Look up an email through the Brevo API, used with --no-cache."""
+    ids = []
+    if email:
+        try:
+            resp = api.get_contact_info(email)
+            log.debug("Found contact by email: id=%s", resp.id)
+            ids.append(resp.id)
+        except ApiException as e:
+            if e.status != 404:
+                log.error("Error searching by email %s: %s", email, e)
+            else:
+                log.debug("No contact found by email: %s", email)
+        time.sleep(0.2)  # Avoid hitting API rate limits
+    return ids
+
+
+def parse_args(description):
+    """Parse the command line options common to the export scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Look up each email through the Brevo API instead of the downloaded contacts",
+    )
+    parser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help=f"Fuzzy match the names left without a contact (needs rapidfuzz, score >= {FUZZY_SCORE_CUTOFF})",
+    )
+    # Also read from sys.argv by the scripts at import, so it covers their config loading
+    parser.add_argument("--debug", action="store_true", help="Show debug messages")
+    return parser.parse_args()
@@ -0,0 +1,129 @@
+"""
+Brevo contact matching shared by the export scripts.
+
+Contacts are flattened once by build_index, then each row is matched with dict lookups
+by email (lookup_email) or by name (lookup), and optionally fuzzily (fuzzy_lookup).
+"""
+
+import json
+import logging
+import sys
+from collections import defaultdict
+
+log = logging.getLogger(__name__)
+
+FUZZY_SCORE_CUTOFF = 85
+
+
+def normalize_contact(contact):
+    """Return the contact as a dict, or None if it cannot be read."""
+    if isinstance(contact, str):
+        try:
+            return json.loads(contact)
+        except Exception as e:
+            log.warning("Could not deserialize contact: %s", e)
+            return None
+    if isinstance(contact, dict):
+        return contact
+    if hasattr(contact, "to_dict"):
+        return contact.to_dict()
+    return vars(contact)
+
+
+def name_key(firstname, lastname):
+    """Normalize a name into the interned (firstname, lastname) key used by the name index."""
+    return sys.intern(firstname.strip().lower()), sys.intern(lastname.strip().lower())
+
+
+def build_index(contacts):
+    """
+    Flatten Brevo contacts once into parallel lists of ids, lowered first names, last names and emails,
+    so the full contact objects are not kept around for matching.
+    Returns a dict with those lists plus by_name, mapping a (firstname, lastname) key to a list of
+    positions, by_email, mapping an email to a single position, and known_lastnames.
+    """
+    ids, firstnames, lastnames, emails = [], [], [], []
+    by_name = defaultdict(list)
+    by_email = {}
+    for contact in contacts:
+        contact = normalize_contact(contact)
+        if contact is None:
+            continue
+        contact_id = contact.get("id", "")
+        email = (contact.get("email") or "").strip().lower()
+        attributes = contact.get("attributes") or {}
+        fn, ln = name_key(
+            attributes.get("FIRSTNAME") or contact.get("firstName") or "",
+            attributes.get("LASTNAME") or contact.get("lastName") or "",
+        )
+        position = len(ids)
+        ids.append(contact_id)
+        firstnames.append(fn)
+        lastnames.append(ln)
+        emails.append(email)
+        if fn and ln:
+            by_name[(fn, ln)].append(position)
+        else:
+            log.debug("Contact id=%s email=%s has no name info, skipping name index.", contact_id, email)
+        if email:
+            by_email[email] = position
+    log.debug("Indexed %s names and %s emails from Brevo contacts", len(by_name), len(by_email))
+    return {
+        "ids": ids,
+        "firstnames": firstnames,
+        "lastnames": lastnames,
+        "emails": emails,
+        "by_name": by_name,
+        "by_email": by_email,
+        "known_lastnames": frozenset(ln for _, ln in by_name),
+    }
+
+
+def lookup_email(index, email):
+    """Return the ID of the contact with this email, as a list of zero or one ID."""
+    position = index["by_email"].get(email.lower()) if email else None
+    if position is None:
+        log.debug("No contact found by email: %s", email)
+        return []
+    contact_id = index["ids"][position]
+    log.debug("Found contact by email: id=%s", contact_id)
+    return [contact_id]
+
+
+def lookup(index, firstname, lastname):
+    """Return the IDs of the contacts with exactly this name, ignoring case and surrounding spaces."""
+    key = name_key(firstname, lastname)
+    # Most misses are last names Brevo does not know at all, rule them out with a single set lookup
+    if key[1] not in index["known_lastnames"]:
+        return []
+    positions = index["by_name"].get(key, [])
+    for position in positions:
+        log.debug("Found contact by name: id=%s, email=%s", index["ids"][position], index["emails"][position])
+    return [index["ids"][position] for position in positions]
+
+
+def fuzzy_lookup(index, names, score_cutoff=FUZZY_SCORE_CUTOFF):
+    """
+    Fuzzy match (firstname, lastname) pairs against every named contact in a single rapidfuzz cdist call.
+    Returns, for each pair, the IDs of the contacts scoring at least score_cutoff.
+    Pairs missing a first or last name are not matched, like unnamed contacts are left out of the index.
+    """
+    from rapidfuzz import fuzz, process
+
+    results = [[] for _ in names]
+    keys = [name_key(firstname, lastname) for firstname, lastname in names]
+    queries = [query for query, (fn, ln) in enumerate(keys) if fn and ln]
+    positions = [
+        position
+        for position, (fn, ln) in enumerate(zip(index["firstnames"], index["lastnames"]))
+        if fn and ln
+    ]
+    if not queries or not positions:
+        return results
+    choices = [f"{index['firstnames'][position]} {index['lastnames'][position]}" for position in positions]
+    scores = process.cdist(
+        [" ".join(keys[query]) for query in queries], choices, scorer=fuzz.WRatio, score_cutoff=score_cutoff, workers=-1
+    )
+    for query, row in zip(queries, scores):
+        results[query] = [index["ids"][positions[column]] for column in row.nonzero()[0]]
+    return results
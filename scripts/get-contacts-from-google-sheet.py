@@ -1,24 +1,32 @@
 import csv
 import os
 import sys
-import time
 import json
+import logging
 import tempfile
-import re
 
 import gspread
 from google.oauth2.service_account import Credentials
-from sib_api_v3_sdk import ContactsApi, ApiClient, Configuration
-from sib_api_v3_sdk.rest import ApiException
+
+from brevo_api import get_all_brevo_contacts, get_brevo_api, is_valid_email, parse_args, search_brevo_contact_by_email_api
+from brevo_match import build_index, fuzzy_lookup, lookup, lookup_email
+
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+log = logging.getLogger(__name__)
+# --debug is read from sys.argv here rather than in parse_args, so it also covers the config loading done at import
+if "--debug" in sys.argv[1:]:
+    log.setLevel(logging.DEBUG)
+    logging.getLogger("brevo_api").setLevel(logging.DEBUG)
+    logging.getLogger("brevo_match").setLevel(logging.DEBUG)
 
 # --- CONFIGURATION ---
 
 def load_config():
     config_path = os.path.join(os.environ["USERPROFILE"], ".les_ptits_gilets_config.json")
-    print(f"[DEBUG] Loading config from {config_path}")
+    log.debug("Loading config from %s", config_path)
     with open(config_path, "r", encoding="utf-8") as f:
         config = json.load(f)
-    print(f"[DEBUG] Config loaded: keys={list(config.keys())}")
+    log.debug("Config loaded: keys=%s", list(config.keys()))
     return config
 
 config = load_config()
@@ -26,15 +34,27 @@ config = load_config()
 # Google Sheets
 GOOGLE_SHEET_ID = config["google"]["volunteer_list"]["sheet_id"]
 GOOGLE_SHEET_RANGE = config["google"]["volunteer_list"]["sheet_range"]
+# sheet_range is a worksheet name, or a list of worksheet names fetched together
+GOOGLE_SHEET_RANGES = GOOGLE_SHEET_RANGE if isinstance(GOOGLE_SHEET_RANGE, list) else [GOOGLE_SHEET_RANGE]
 GOOGLE_CREDENTIALS_DICT = config["google"]["credentials"]
 
 # Write the credentials to a hidden temp file for google-auth
 temp_dir = os.path.join(os.environ["USERPROFILE"], ".les_ptits_gilets")
 os.makedirs(temp_dir, exist_ok=True)
 GOOGLE_CREDENTIALS_FILE = os.path.join(temp_dir, "google-credentials.json")
-with open(GOOGLE_CREDENTIALS_FILE, "w", encoding="utf-8") as f:
-    json.dump(GOOGLE_CREDENTIALS_DICT, f)
-print(f"[DEBUG] Google credentials written to {GOOGLE_CREDENTIALS_FILE}")
+credentials_json = json.dumps(GOOGLE_CREDENTIALS_DICT, sort_keys=True)
+# Only rewrite the file when the credentials changed since the last run
+try:
+    with open(GOOGLE_CREDENTIALS_FILE, "r", encoding="utf-8") as f:
+        credentials_changed = f.read() != credentials_json
+except FileNotFoundError:
+    credentials_changed = True
+if credentials_changed:
+    with open(GOOGLE_CREDENTIALS_FILE, "w", encoding="utf-8") as f:
+        f.write(credentials_json)
+    log.debug("Google credentials written to %s", GOOGLE_CREDENTIALS_FILE)
+else:
+    log.debug("Google credentials unchanged in %s", GOOGLE_CREDENTIALS_FILE)
 
 # Brevo (Sendinblue)
 BREVO_API_KEY = config["brevo"]["api_key"]
@@ -42,14 +62,11 @@ BREVO_API_KEY = config["brevo"]["api_key"]
 # Output CSV
 OUTPUT_CSV = "contacts_export.csv"
 
-def is_valid_email(email):
-    # Simple regex for email validation
-    return bool(re.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", email))
-
 # --- GOOGLE SHEETS SETUP ---
 
 def get_google_sheet_rows():
-    print(f"[DEBUG] Connecting to Google Sheets with ID: {GOOGLE_SHEET_ID}, Range: {GOOGLE_SHEET_RANGE}")
+    """Return (worksheet name, row number, row) for every volunteer row of the configured worksheets."""
+    log.debug("Connecting to Google Sheets with ID: %s, Range: %s", GOOGLE_SHEET_ID, GOOGLE_SHEET_RANGE)
     scopes = [
         "https://www.googleapis.com/auth/spreadsheets.readonly",
         "https://www.googleapis.com/auth/drive.readonly"
@@ -57,127 +74,92 @@ def get_google_sheet_rows():
     creds = Credentials.from_service_account_file(GOOGLE_CREDENTIALS_FILE, scopes=scopes)
     gc = gspread.authorize(creds)
     sh = gc.open_by_key(GOOGLE_SHEET_ID)
-    worksheet = sh.worksheet(GOOGLE_SHEET_RANGE)
-    rows = worksheet.get_all_values()
-    print(f"[DEBUG] Retrieved {len(rows)} rows from Google Sheet")
-    return rows[7:]  # Skip first 7 lines
-
-# --- BREVO SETUP ---
-
-def get_brevo_api():
-    print("[DEBUG] Initializing Brevo API client")
-    configuration = Configuration()
-    configuration.api_key['api-key'] = BREVO_API_KEY
-    return ContactsApi(ApiClient(configuration))
-
-def get_all_brevo_contacts(api):
-    """Download all Brevo contacts and return as a list."""
-    all_contacts = []
-    limit = 50
-    offset = 0
-    print("[DEBUG] Downloading all Brevo contacts...")
-    while True:
-        print(f"[DEBUG] Fetching Brevo contacts batch: offset={offset}, limit={limit}")
-        resp = api.get_contacts(limit=limit, offset=offset)
-        all_contacts.extend(resp.contacts)
-        if len(resp.contacts) < limit:
-            break
-        offset += limit
-    print(f"[DEBUG] Downloaded {len(all_contacts)} contacts from Brevo.")
-    return all_contacts
-
-def search_brevo_contact_by_email(api, email):
-    ids = []
-    contacts = []
-    if email:
-        try:
-            resp = api.get_contact_info(email)
-            print(f"[DEBUG] Found contact by email: id={resp.id}")
-            ids.append(resp.id)
-            contacts.append(resp)
-        except ApiException as e:
-            if e.status != 404:
-                print(f"[ERROR] Error searching by email {email}: {e}", file=sys.stderr)
-            else:
-                print(f"[DEBUG] No contact found by email: {email}")
-    return ids, contacts
-
-def search_brevo_contact_by_name_cached(all_contacts, firstname, lastname):
-    found_ids = []
-    found_contacts = []
-    for contact in all_contacts:
-        # print(f"[DEBUG] Raw contact: {contact}")
-        if isinstance(contact, str):
-            try:
-                contact = json.loads(contact)
-            except Exception as e:
-                print(f"[WARNING] Could not deserialize contact: {e}", file=sys.stderr)
-                continue
-        attributes = getattr(contact, "attributes", None)
-        if attributes is None and isinstance(contact, dict):
-            attributes = contact.get("attributes", None)
-        if not attributes:
-            # print(f"[WARNING] Contact id={getattr(contact, 'id', contact.get('id', ''))} email={getattr(contact, 'email', contact.get('email', ''))} has no attributes, skipping.", file=sys.stderr)
-            continue
-        fn = attributes.get("FIRSTNAME", "").strip().lower()
-        ln = attributes.get("LASTNAME", "").strip().lower()
-        if fn == firstname.strip().lower() and ln == lastname.strip().lower():
-            print(f"[DEBUG] Found contact by name: id={getattr(contact, 'id', contact.get('id', ''))}, email={getattr(contact, 'email', contact.get('email', ''))}")
-            found_ids.append(getattr(contact, "id", contact.get("id", "")))
-            found_contacts.append(contact)
-    return found_ids, found_contacts
+    # Fetch every worksheet in a single batchGet round-trip. Skip the first 7 lines and only
+    # request the lastname, firstname, email and SMS columns; formatted values keep phone numbers as text.
+    ranges = ["'{}'!A8:D".format(name.replace("'", "''")) for name in GOOGLE_SHEET_RANGES]
+    response = sh.values_batch_get(ranges, params={"valueRenderOption": "FORMATTED_VALUE"})
+    rows = []
+    # valueRanges come back in the order of the requested ranges
+    for sheet_name, value_range in zip(GOOGLE_SHEET_RANGES, response.get("valueRanges", [])):
+        for row_number, row in enumerate(value_range.get("values", []), start=8):
+            # The API omits trailing empty cells, pad so every row has the 4 columns
+            rows.append((sheet_name, row_number, row + [""] * (4 - len(row))))
+    log.debug("Retrieved %s rows from Google Sheet", len(rows))
+    return rows
 
 # --- MAIN LOGIC ---
 
 def main():
+    args = parse_args("Export Brevo contact IDs for the volunteer Google Sheet.")
     if not BREVO_API_KEY:
         print("Please set the BREVO_API_KEY environment variable.", file=sys.stderr)
         sys.exit(1)
 
-    print("[DEBUG] Starting main process")
+    log.debug("Starting main process")
     rows = get_google_sheet_rows()
-    api = get_brevo_api()
+    api = get_brevo_api(BREVO_API_KEY)
 
     # Download all Brevo contacts once
     all_brevo_contacts = get_all_brevo_contacts(api)
-
-    with open(OUTPUT_CSV, "w", newline='', encoding="utf-8") as csvfile:
+    brevo_index = build_index(all_brevo_contacts)
+
+    out_rows = []
+    for sheet_name, idx, row in rows:
+        lastname = row[0].strip()
+        firstname = row[1].strip()
+        email = row[2].strip()
+        sms = row[3].strip()
+        log.debug("Processing %s row %s: %s %s, email=%s, sms=%s", sheet_name, idx, firstname, lastname, email, sms)
+
+        # Validate email before querying Brevo
+        ids_email = []
+        if is_valid_email(email):
+            if args.no_cache:
+                ids_email = search_brevo_contact_by_email_api(api, email)
+            else:
+                ids_email = lookup_email(brevo_index, email)
+        else:
+            log.warning("Invalid email '%s' for %s %s (%s row %s), skipping email lookup.", email, firstname, lastname, sheet_name, idx)
+
+        # An email match identifies the contact, only fall back to the name search without one
+        ids_name = []
+        if not ids_email:
+            ids_name = lookup(brevo_index, firstname, lastname)
+
+        # Merge and deduplicate IDs
+        all_ids = set(ids_email) | set(ids_name)
+        if len(all_ids) == 1:
+            contact_id = list(all_ids)[0]
+            log.debug("Unique contact found: %s", contact_id)
+        elif len(all_ids) > 1:
+            log.warning("Multiple contacts found for %s %s (%s row %s)", firstname, lastname, sheet_name, idx)
+            contact_id = "MULTIPLE"
+        else:
+            log.debug("No contact found for %s %s", firstname, lastname)
+            contact_id = ""
+
+        out_rows.append([contact_id, email, firstname, lastname, sms])
+
+    if args.fuzzy:
+        # Match every row still without a contact in one batch
+        unmatched = [out_row for out_row in out_rows if not out_row[0]]
+        fuzzy_ids = fuzzy_lookup(brevo_index, [(out_row[2], out_row[3]) for out_row in unmatched])
+        for out_row, ids in zip(unmatched, fuzzy_ids):
+            ids = set(ids)
+            if len(ids) == 1:
+                out_row[0] = ids.pop()
+                # A fuzzy ID may belong to someone else, surface it so it is checked before the Brevo import
+                log.info("Fuzzy contact %s for %s %s (%s), check it before importing", out_row[0], out_row[2], out_row[3], out_row[1])
+            elif ids:
+                log.warning("Multiple fuzzy contacts found for %s %s", out_row[2], out_row[3])
+                out_row[0] = "MULTIPLE"
+
+    with open(OUTPUT_CSV, "w", newline='', encoding="utf-8", buffering=1 << 20) as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["CONTACT ID", "EMAIL", "FIRSTNAME", "LASTNAME", "SMS"])
+        writer.writerows(out_rows)
 
-        for idx, row in enumerate(rows, start=8):
-            lastname = row[0].strip()
-            firstname = row[1].strip()
-            email = row[2].strip()
-            sms = row[3].strip()
-            print(f"[DEBUG] Processing row {idx}: {firstname} {lastname}, email={email}, sms={sms}")
-
-            # Validate email before querying Brevo
-            ids_email, contacts_email = [], []
-            if is_valid_email(email):
-                ids_email, contacts_email = search_brevo_contact_by_email(api, email)
-            else:
-                print(f"[WARNING] Invalid email '{email}' for {firstname} {lastname} (row {idx}), skipping email lookup.", file=sys.stderr)
-
-            # Use cached contacts for name search
-            ids_name, contacts_name = search_brevo_contact_by_name_cached(all_brevo_contacts, firstname, lastname)
-
-            # Merge and deduplicate IDs
-            all_ids = set(ids_email) | set(ids_name)
-            if len(all_ids) == 1:
-                contact_id = list(all_ids)[0]
-                print(f"[DEBUG] Unique contact found: {contact_id}")
-            elif len(all_ids) > 1:
-                print(f"[WARNING] Multiple contacts found for {firstname} {lastname} (row {idx})", file=sys.stderr)
-                contact_id = "MULTIPLE"
-            else:
-                print(f"[DEBUG] No contact found for {firstname} {lastname}")
-                contact_id = ""
-
-            writer.writerow([contact_id, email, firstname, lastname, sms])
-            time.sleep(0.2)  # Avoid hitting API rate limits
-
-    print(f"[DEBUG] Exported to {OUTPUT_CSV}")
+    log.info("Exported to %s", OUTPUT_CSV)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,12 +3,36 @@ import os
 import sys
 import time
 import json
+import logging
+import orjson
 import requests
-from datetime import datetime, timedelta
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from sib_api_v3_sdk import ContactsApi, ApiClient, Configuration
 from sib_api_v3_sdk.rest import ApiException
 
+from brevo_api import (
+    get_all_brevo_contacts,
+    get_all_brevo_contacts_paginated,
+    get_brevo_api,
+    is_valid_email,
+    parse_args,
+    search_brevo_contact_by_email_api,
+)
+from brevo_match import build_index, fuzzy_lookup, lookup, lookup_email
+
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+log = logging.getLogger(__name__)
+# --debug is read from sys.argv here rather than in parse_args, so it also covers the config loading done at import
+if "--debug" in sys.argv[1:]:
+    log.setLevel(logging.DEBUG)
+    logging.getLogger("brevo_api").setLevel(logging.DEBUG)
+    logging.getLogger("brevo_match").setLevel(logging.DEBUG)
+
 # --- CONFIGURATION ---
 
 
@@ -16,10 +40,10 @@ def load_config():
     config_path = os.path.join(
         os.environ["USERPROFILE"], ".les_ptits_gilets_config.json"
     )
-    print(f"[DEBUG] Loading config from {config_path}")
+    log.debug("Loading config from %s", config_path)
     with open(config_path, "r", encoding="utf-8") as f:
         config = json.load(f)
-    print(f"[DEBUG] Config loaded: keys={list(config.keys())}")
+    log.debug("Config loaded: keys=%s", list(config.keys()))
     return config
 
 
@@ -31,6 +55,8 @@ HELLOASSO_CLIENT_SECRET = config["helloasso"]["client_secret"]
 HELLOASSO_ORG_SLUG = config["helloasso"]["org_slug"]
 HELLOASSO_FORM_TYPE = config["helloasso"].get("form_type", "membership")
 HELLOASSO_FORM_SLUG = config["helloasso"]["form_slug"]
+HELLOASSO_PAGE_SIZE = 50
+HELLOASSO_MAX_WORKERS = 8
 
 # Brevo (Sendinblue)
 BREVO_API_KEY = config["brevo"]["api_key"]
@@ -41,36 +67,41 @@ OUTPUT_CSV = "contacts_export.csv"
 HELLOASSO_MEMBERS_FILE = "helloasso_members.json"
 BREVO_CONTACTS_FILE = "brevo_contacts.json"
 INTERMEDIATE_ROWS_FILE = "intermediate_rows.json"
+INTERMEDIATE_FLUSH_EVERY = 100
 
 def save_json(obj, path):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f)
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj))
 
 def load_json(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
 
-def save_jsonl_row(row, path):
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(row) + "\n")
+def save_jsonl_row(row, f):
+    f.write(orjson.dumps(row) + b"\n")
 
 def load_jsonl_rows(path):
     rows = []
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "rb") as f:
         for line in f:
-            rows.append(json.loads(line))
+            rows.append(orjson.loads(line))
     return rows
 
-def is_valid_email(email):
-    import re
 
-    return bool(re.match(r"^[^@\s]+@[^@\s]+\.[^@\s]+$", email))
+# --- HELLOASSO AUTH ---
 
 
-# --- HELLOASSO AUTH ---
+def get_helloasso_session():
+    """Create an HTTP session reused for every HelloAsso call, with keep-alive and retries on transient errors."""
+    session = requests.Session()
+    # Return the last response once retries run out, so callers still see its status code
+    retries = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=retries)
+    session.mount("https://", adapter)
+    return session
 
 
-def get_helloasso_access_token(client_id, client_secret):
+def get_helloasso_access_token(session, client_id, client_secret):
     url = "https://api.helloasso.com/oauth2/token"
     headers = {"content-type": "application/x-www-form-urlencoded"}
     data = {
@@ -78,275 +109,299 @@ def get_helloasso_access_token(client_id, client_secret):
         "client_id": client_id,
         "client_secret": client_secret,
     }
-    resp = requests.post(url, headers=headers, data=data)
+    resp = session.post(url, headers=headers, data=data, timeout=30)
     if resp.status_code != 200:
         raise Exception(f"Failed to get token: {resp.status_code} {resp.text}")
     token = resp.json()["access_token"]
-    print(
-        f"[DEBUG] Got HelloAsso access token: {token[:8]}..."
-    )  # Only print first chars for security
+    log.debug("Got HelloAsso access token: %s...", token[:8])  # Only log first chars for security
     return token
 
 
 # --- HELLOASSO SETUP ---
 
 
-def get_helloasso_members(access_token):
+def parse_helloasso_items(data):
+    """Convert the items of one HelloAsso page into member dicts."""
+    members = []
+    for item in data.get("data", []):
+        payer = item.get("payer", {})
+        order = item.get("order", {})
+        lastname = payer.get("lastName", "").strip()
+        firstname = payer.get("firstName", "").strip()
+        email = payer.get("email", "").strip()
+        date_adhesion = order.get("date", "")
+        members.append(
+            {
+                "lastname": lastname,
+                "firstname": firstname,
+                "email": email,
+                "date_adhesion": date_adhesion,
+            }
+        )
+    return members
+
+
+def fetch_helloasso_page(session, headers, page_index=None, continuation_token=None):
+    """Fetch one page of HelloAsso items, by page index or continuation token. Returns None on failure."""
+    url = (
+        f"https://api.helloasso.com/v5/organizations/{HELLOASSO_ORG_SLUG}/forms/"
+        f"{HELLOASSO_FORM_TYPE}/{HELLOASSO_FORM_SLUG}/items"
+        f"?pageSize={HELLOASSO_PAGE_SIZE}"
+    )
+    if page_index:
+        url += f"&pageIndex={page_index}"
+    if continuation_token:
+        url += f"&continuationToken={continuation_token}"
+    log.debug("Requesting: %s", url)
+    try:
+        resp = session.get(url, headers=headers, timeout=30)
+    except requests.RequestException as e:
+        log.error("Failed to fetch HelloAsso members: %s", e)
+        return None
+    if resp.status_code != 200:
+        log.error("Failed to fetch HelloAsso members: %s %s", resp.status_code, resp.text)
+        return None
+    return resp.json()
+
+
+def get_helloasso_members(session, access_token):
     """
     Fetch all HelloAsso members for the given organization and form.
-    Returns a list of dicts with keys: lastname, firstname, email, phone, membership_date, first_participation, comments
+    The first page gives the total page count, the remaining pages are fetched concurrently.
+    Returns (members, complete) where members is a list of dicts with keys: lastname, firstname, email,
+    date_adhesion, and complete is False when any page could not be fetched.
     """
-    print(
-        f"[DEBUG] Fetching HelloAsso members for org '{HELLOASSO_ORG_SLUG}' and form '{HELLOASSO_FORM_SLUG}'"
-    )
+    log.debug("Fetching HelloAsso members for org '%s' and form '%s'", HELLOASSO_ORG_SLUG, HELLOASSO_FORM_SLUG)
     headers = {"Authorization": f"Bearer {access_token}"}
-    members = []
-    previous_token = None
-    continuation_token = None
-    per_page = 50
-    while True:
-        url = (
-            f"https://api.helloasso.com/v5/organizations/{HELLOASSO_ORG_SLUG}/forms/"
-            f"{HELLOASSO_FORM_TYPE}/{HELLOASSO_FORM_SLUG}/items"
-            f"?pageSize={per_page}"
-        )
-        if continuation_token:
-            url += f"&continuationToken={continuation_token}"
-        print(f"[DEBUG] Requesting: {url}")
-        resp = requests.get(url, headers=headers)
-        if resp.status_code != 200:
-            print(
-                f"[ERROR] Failed to fetch HelloAsso members: {resp.status_code} {resp.text}",
-                file=sys.stderr,
-            )
-            break
-        data = resp.json()
-        for item in data.get("data", []):
-            payer = item.get("payer", {})
-            order = item.get("order", {})
-            lastname = payer.get("lastName", "").strip()
-            firstname = payer.get("firstName", "").strip()
-            email = payer.get("email", "").strip()
-            date_adhesion = order.get("date", "")
-            members.append(
-                {
-                    "lastname": lastname,
-                    "firstname": firstname,
-                    "email": email,
-                    "date_adhesion": date_adhesion,
-                }
+    data = fetch_helloasso_page(session, headers, page_index=1)
+    if data is None:
+        return [], False
+    members = parse_helloasso_items(data)
+    complete = True
+    pagination = data.get("pagination", {})
+    total_pages = pagination.get("totalPages")
+    if total_pages:
+        with ThreadPoolExecutor(max_workers=HELLOASSO_MAX_WORKERS) as executor:
+            pages = executor.map(
+                lambda page_index: fetch_helloasso_page(session, headers, page_index=page_index),
+                range(2, total_pages + 1),
             )
-        previous_token = continuation_token
-        continuation_token = data.get("pagination", {}).get("continuationToken")
-        # Break if no token or token did not change
-        if not continuation_token or continuation_token == previous_token:
-            break
-    print(f"[DEBUG] Retrieved {len(members)} HelloAsso members")
-    return members
+            for page in pages:
+                if page is None:
+                    complete = False
+                else:
+                    members.extend(parse_helloasso_items(page))
+    else:
+        # No page count in the response, follow the continuation tokens instead
+        previous_token = None
+        continuation_token = pagination.get("continuationToken")
+        while continuation_token and continuation_token != previous_token:
+            data = fetch_helloasso_page(session, headers, continuation_token=continuation_token)
+            if data is None:
+                complete = False
+                break
+            members.extend(parse_helloasso_items(data))
+            previous_token = continuation_token
+            continuation_token = data.get("pagination", {}).get("continuationToken")
+    log.debug("Retrieved %s HelloAsso members", len(members))
+    return members, complete
+
+
+def parse_date_adhesion(member):
+    """
+    Parse the member's ISO 8601 date_adhesion, keeping its local wall time so it formats as HelloAsso shows it.
+    Returns None when the date is missing or invalid.
+    """
+    date_adhesion = member["date_adhesion"]
+    if not date_adhesion:
+        return None
+    try:
+        return datetime.fromisoformat(date_adhesion.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError as e:
+        log.warning("Could not parse date '%s' for %s %s: %s", date_adhesion, member["firstname"], member["lastname"], e)
+        return None
+
+
+def deduplicate_members(members):
+    """
+    Keep a single member per (email, firstname, lastname), the one with the latest date_adhesion.
+    Each returned member gets its parsed date_adhesion under "dt".
+    """
+    unique = {}
+    for member in members:
+        member = {**member, "dt": parse_date_adhesion(member)}
+        key = (member["email"].lower(), member["firstname"].lower(), member["lastname"].lower())
+        kept = unique.get(key)
+        if kept is None or (member["dt"] and (kept["dt"] is None or member["dt"] > kept["dt"])):
+            unique[key] = member
+    return list(unique.values())
 
 
 # --- BREVO SETUP ---
 
 
-def get_brevo_api():
-    print("[DEBUG] Initializing Brevo API client")
-    configuration = Configuration()
-    configuration.api_key["api-key"] = BREVO_API_KEY
-    return ContactsApi(ApiClient(configuration))
-
-
-def get_all_brevo_contacts(api):
-    """Download all Brevo contacts and return as a list."""
-    all_contacts = []
-    limit = 50
-    offset = 0
-    print("[DEBUG] Downloading all Brevo contacts...")
-    while True:
-        print(f"[DEBUG] Fetching Brevo contacts batch: offset={offset}, limit={limit}")
-        resp = api.get_contacts(limit=limit, offset=offset)
-        all_contacts.extend(resp.contacts)
-        if len(resp.contacts) < limit:
-            break
-        offset += limit
-    print(f"[DEBUG] Downloaded {len(all_contacts)} contacts from Brevo.")
-    return all_contacts
-
-
-def search_brevo_contact_by_email(api, email):
-    ids = []
-    contacts = []
-    if email:
-        try:
-            resp = api.get_contact_info(email)
-            print(f"[DEBUG] Found contact by email: id={resp.id}")
-            ids.append(resp.id)
-            contacts.append(resp)
-        except ApiException as e:
-            if e.status != 404:
-                print(f"[ERROR] Error searching by email {email}: {e}", file=sys.stderr)
-            else:
-                print(f"[DEBUG] No contact found by email: {email}")
-    return ids, contacts
-
-
-def search_brevo_contact_by_name_cached(all_contacts, firstname, lastname):
-    found_ids = []
-    found_contacts = []
-    for contact in all_contacts:
-        if isinstance(contact, str):
-            try:
-                contact = json.loads(contact)
-            except Exception as e:
-                print(f"[WARNING] Could not deserialize contact: {e}", file=sys.stderr)
-                continue
-        attributes = getattr(contact, "attributes", None)
-        if attributes is None and isinstance(contact, dict):
-            attributes = contact.get("attributes", None)
-        fn = ln = ""
-        if attributes:
-            fn = attributes.get("FIRSTNAME", "").strip().lower()
-            ln = attributes.get("LASTNAME", "").strip().lower()
-        if not fn and hasattr(contact, "firstName"):
-            fn = getattr(contact, "firstName", "").strip().lower()
-        if not ln and hasattr(contact, "lastName"):
-            ln = getattr(contact, "lastName", "").strip().lower()
-        if not fn and isinstance(contact, dict):
-            fn = contact.get("firstName", "").strip().lower()
-        if not ln and isinstance(contact, dict):
-            ln = contact.get("lastName", "").strip().lower()
-        if not (fn and ln):
-            print(
-                f"[WARNING] Contact id={getattr(contact, 'id', contact.get('id', ''))} email={getattr(contact, 'email', contact.get('email', ''))} has no name info, skipping.",
-                file=sys.stderr,
-            )
-            continue
-        if fn == firstname.strip().lower() and ln == lastname.strip().lower():
-            print(
-                f"[DEBUG] Found contact by name: id={getattr(contact, 'id', contact.get('id', ''))}, email={getattr(contact, 'email', contact.get('email', ''))}"
-            )
-            found_ids.append(getattr(contact, "id", contact.get("id", "")))
-            found_contacts.append(contact)
-    return found_ids, found_contacts
+def sync_brevo_contacts_cache(api, path):
+    """
+    Load the cached Brevo contacts and merge in the contacts modified since the cache was last written.
+    The cache is rewritten and its mtime set to the start of the sync, which is where the next sync resumes.
+    Contacts deleted from Brevo are not detected, remove the cache file to download everything again.
+    If Brevo cannot be reached, the cached contacts are used as they are and the mtime is left untouched.
+    """
+    sync_started = time.time()
+    contacts = load_json(path)
+    modified_since = datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc)
+    try:
+        modified = get_all_brevo_contacts_paginated(
+            api, modified_since=modified_since.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        )
+    except (ApiException, urllib3.exceptions.HTTPError) as e:
+        log.warning("Could not fetch Brevo contacts modified since %s, using the cached contacts: %s", modified_since, e)
+        return contacts
+    if modified:
+        contacts_by_id = {contact.get("id"): contact for contact in contacts}
+        for contact in modified:
+            # If Brevo contacts are objects, convert to dicts for JSON
+            contact = contact if isinstance(contact, dict) else contact.__dict__
+            contacts_by_id[contact.get("id")] = contact
+        contacts = list(contacts_by_id.values())
+        save_json(contacts, path)
+    log.debug("Merged %s Brevo contacts modified since %s", len(modified), modified_since)
+    os.utime(path, (sync_started, sync_started))
+    return contacts
 
 
 # --- MAIN LOGIC ---
 
 
 def main():
+    args = parse_args("Export Brevo contact IDs for the HelloAsso members.")
     # 1. Fetch or load HelloAsso members
     if os.path.exists(HELLOASSO_MEMBERS_FILE):
-        print("[DEBUG] Loading HelloAsso members from file")
+        log.debug("Loading HelloAsso members from file")
         members = load_json(HELLOASSO_MEMBERS_FILE)
     else:
-        helloasso_access_token = get_helloasso_access_token(HELLOASSO_CLIENT_ID, HELLOASSO_CLIENT_SECRET)
-        members = get_helloasso_members(helloasso_access_token)
-        save_json(members, HELLOASSO_MEMBERS_FILE)
+        helloasso_session = get_helloasso_session()
+        helloasso_access_token = get_helloasso_access_token(helloasso_session, HELLOASSO_CLIENT_ID, HELLOASSO_CLIENT_SECRET)
+        members, complete = get_helloasso_members(helloasso_session, helloasso_access_token)
+        # Only cache a complete member list, otherwise the missing members would stay missing on later runs
+        if complete:
+            save_json(members, HELLOASSO_MEMBERS_FILE)
+        else:
+            log.warning("Some HelloAsso pages could not be fetched, %s not written", HELLOASSO_MEMBERS_FILE)
 
     # 2. Fetch or load Brevo contacts
-    api = get_brevo_api()
+    api = get_brevo_api(BREVO_API_KEY)
     if os.path.exists(BREVO_CONTACTS_FILE):
-        print("[DEBUG] Loading Brevo contacts from file")
-        all_brevo_contacts = load_json(BREVO_CONTACTS_FILE)
+        log.debug("Loading Brevo contacts from file")
+        all_brevo_contacts = sync_brevo_contacts_cache(api, BREVO_CONTACTS_FILE)
     else:
+        # Like a sync, the cache mtime is the start of the download so the next sync does not miss any change
+        download_started = time.time()
         all_brevo_contacts = get_all_brevo_contacts(api)
         # If Brevo contacts are objects, convert to dicts for JSON
         all_brevo_contacts = [c if isinstance(c, dict) else c.__dict__ for c in all_brevo_contacts]
         save_json(all_brevo_contacts, BREVO_CONTACTS_FILE)
+        os.utime(BREVO_CONTACTS_FILE, (download_started, download_started))
+    brevo_index = build_index(all_brevo_contacts)
 
     # 3. Load already processed rows if any
     processed_keys = set()
     csv_rows = []
     if os.path.exists(INTERMEDIATE_ROWS_FILE):
-        print("[DEBUG] Loading intermediate rows")
+        log.debug("Loading intermediate rows")
         for row in load_jsonl_rows(INTERMEDIATE_ROWS_FILE):
             key = (row["email"].lower(), row["firstname"].lower(), row["lastname"].lower())
             processed_keys.add(key)
             csv_rows.append(row)
 
-    csv_rows = []
-    for idx, member in enumerate(members, start=1):
-        lastname = member["lastname"]
-        firstname = member["firstname"]
-        email = member["email"]
-        date_adhesion = member["date_adhesion"]
-
-        # Format DATE_ADHESION as "dd/MM/YYYY"
-        formatted_date = ""
-        if date_adhesion:
-            try:
-                dt = datetime.fromisoformat(date_adhesion.replace("Z", "+00:00"))
-                formatted_date = dt.strftime("%d/%m/%Y")
-            except Exception as e:
-                print(f"[WARNING] Could not parse date '{date_adhesion}' for {firstname} {lastname}: {e}", file=sys.stderr)
-                formatted_date = date_adhesion  # fallback
-
-        print(f"[DEBUG] Processing member {idx}: {firstname} {lastname}, email={email}, date_adhesion={formatted_date}")
-
-        ids_email, contacts_email = [], []
-        if is_valid_email(email):
-            ids_email, contacts_email = search_brevo_contact_by_email(api, email)
-        else:
-            print(f"[WARNING] Invalid email '{email}' for {firstname} {lastname} (member {idx}), skipping email lookup.", file=sys.stderr)
-
-        ids_name, contacts_name = search_brevo_contact_by_name_cached(all_brevo_contacts, firstname, lastname)
+    # Renewals show up as several members, look each contact up only once
+    unique_members = deduplicate_members(members)
+    log.debug("%s unique members out of %s", len(unique_members), len(members))
 
-        all_ids = set(ids_email) | set(ids_name)
-        if len(all_ids) == 1:
-            contact_id = list(all_ids)[0]
-            print(f"[DEBUG] Unique contact found: {contact_id}")
-        elif len(all_ids) > 1:
-            print(f"[WARNING] Multiple contacts found for {firstname} {lastname} (member {idx})", file=sys.stderr)
-            contact_id = "MULTIPLE"
-        else:
-            print(f"[DEBUG] No contact found for {firstname} {lastname}")
-            contact_id = ""
-
-        row = {
-            "contact_id": contact_id,
-            "email": email,
-            "firstname": firstname,
-            "lastname": lastname,
-            "formatted_date": formatted_date,
-            "ADHESION_OK": True
-        }
-        csv_rows.append(row)
-        save_jsonl_row(row, INTERMEDIATE_ROWS_FILE)
-
-    # Deduplicate by (email, firstname, lastname), keeping the latest DATE_ADHESION
-    deduped = {}
-    for row in csv_rows:
-        key = (row["email"].lower(), row["firstname"].lower(), row["lastname"].lower())
-        date_str = row["formatted_date"]
-        try:
-            date_obj = datetime.strptime(date_str, "%d/%m/%Y")
-        except Exception:
-            date_obj = None
-        if key not in deduped or (
-            date_obj and deduped[key]["date_obj"] and date_obj > deduped[key]["date_obj"]
-        ):
-            deduped[key] = {**row, "date_obj": date_obj}
-
-    # Add ADHESION_OK column
     one_year_ago = datetime.now() - timedelta(days=365)
-    for row in deduped.values():
-        date_obj = row.get("date_obj")
-        row["ADHESION_OK"] = bool(date_obj and date_obj > one_year_ago)
+    csv_rows = []
+    # Keep the intermediate file open for the whole loop and flush it periodically
+    with open(INTERMEDIATE_ROWS_FILE, "ab", buffering=1 << 16) as intermediate_file:
+        for idx, member in enumerate(unique_members, start=1):
+            lastname = member["lastname"]
+            firstname = member["firstname"]
+            email = member["email"]
+            dt = member["dt"]
+
+            log.debug("Processing member %s: %s %s, email=%s, date_adhesion=%s", idx, firstname, lastname, email, dt)
+
+            ids_email = []
+            if is_valid_email(email):
+                if args.no_cache:
+                    ids_email = search_brevo_contact_by_email_api(api, email)
+                else:
+                    ids_email = lookup_email(brevo_index, email)
+            else:
+                log.warning("Invalid email '%s' for %s %s (member %s), skipping email lookup.", email, firstname, lastname, idx)
+
+            # An email match identifies the contact, only fall back to the name search without one
+            ids_name = []
+            if not ids_email:
+                ids_name = lookup(brevo_index, firstname, lastname)
+
+            all_ids = set(ids_email) | set(ids_name)
+            if len(all_ids) == 1:
+                contact_id = list(all_ids)[0]
+                log.debug("Unique contact found: %s", contact_id)
+            elif len(all_ids) > 1:
+                log.warning("Multiple contacts found for %s %s (member %s)", firstname, lastname, idx)
+                contact_id = "MULTIPLE"
+            else:
+                log.debug("No contact found for %s %s", firstname, lastname)
+                contact_id = ""
+
+            row = {
+                "contact_id": contact_id,
+                "email": email,
+                "firstname": firstname,
+                "lastname": lastname,
+                "date_adhesion": member["date_adhesion"],
+                "dt": dt,
+                "ADHESION_OK": bool(dt and dt > one_year_ago),
+            }
+            csv_rows.append(row)
+            save_jsonl_row(row, intermediate_file)
+            if idx % INTERMEDIATE_FLUSH_EVERY == 0:
+                intermediate_file.flush()
+
+    if args.fuzzy:
+        # Match every member still without a contact in one batch
+        unmatched = [row for row in csv_rows if not row["contact_id"]]
+        fuzzy_ids = fuzzy_lookup(brevo_index, [(row["firstname"], row["lastname"]) for row in unmatched])
+        for row, ids in zip(unmatched, fuzzy_ids):
+            ids = set(ids)
+            if len(ids) == 1:
+                row["contact_id"] = ids.pop()
+                # A fuzzy ID may belong to someone else, surface it so it is checked before the Brevo import
+                log.info(
+                    "Fuzzy contact %s for %s %s (%s), check it before importing",
+                    row["contact_id"], row["firstname"], row["lastname"], row["email"],
+                )
+            elif ids:
+                log.warning("Multiple fuzzy contacts found for %s %s", row["firstname"], row["lastname"])
+                row["contact_id"] = "MULTIPLE"
 
     # Write to CSV
     with open(OUTPUT_CSV, "w", newline='', encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(["CONTACT ID", "EMAIL", "FIRSTNAME", "LASTNAME", "DATE_ADHESION", "ADHESION_OK"])
-        for row in deduped.values():
+        for row in csv_rows:
             writer.writerow([
                 row["contact_id"],
                 row["email"],
                 row["firstname"],
                 row["lastname"],
-                row["formatted_date"],
+                # Format DATE_ADHESION as "dd/MM/YYYY", keeping the raw value when it could not be parsed
+                row["dt"].strftime("%d/%m/%Y") if row["dt"] else row["date_adhesion"],
                 str(row["ADHESION_OK"]).lower()
             ])
 
-    print(f"[DEBUG] Exported to {OUTPUT_CSV}")
+    log.info("Exported to %s", OUTPUT_CSV)
 
 
 if __name__ == "__main__":